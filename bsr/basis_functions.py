@@ -19,16 +19,24 @@ def gg_1d(x, a, mu, sigma, beta):
     is excluded to avoid degeneracies between sigma and a, so the maxiumum of
     the basis function = a.
     """
-    return a * np.exp(-((np.absolute(x - mu) / sigma) ** beta))
+    y = np.absolute(x - mu)
+    y /= sigma
+    y **= beta
+    return a * np.exp(-y)
 
 
 def gg_2d(x1, x2, a, mu1, mu2, sigma1, sigma2, beta1, beta2, omega):
     """2d generalised gaussian.
 
     omega is counterclockwise rotation angle in (x1, x2) plane."""
-    # Rotate gen gaussian around the mean
-    x1_new = np.cos(omega) * (x1 - mu1) - np.sin(omega) * (x2 - mu2)
-    x2_new = np.sin(omega) * (x1 - mu1) + np.cos(omega) * (x2 - mu2)
+    # Rotate gen gaussian around the mean, computing the trig factors and
+    # centred coordinates once each rather than once per rotated component
+    cos_omega = np.cos(omega)
+    sin_omega = np.sin(omega)
+    dx1 = x1 - mu1
+    dx2 = x2 - mu2
+    x1_new = cos_omega * dx1 - sin_omega * dx2
+    x2_new = sin_omega * dx1 + cos_omega * dx2
     # NB we do not include means as x1_new and x2_new are relative to means
     return (a * gg_1d(x1_new, 1.0, 0, sigma1, beta1)
             * gg_1d(x2_new, 1.0, 0, sigma2, beta2))
@@ -49,7 +57,9 @@ def adfam_gg_ta_1d(x1, theta, nfunc, **kwargs):
     assert kwargs.get('x2', None) is None
     assert kwargs.get('adaptive')
     try:
-        family = int(np.round(theta[0]))
+        # round (not np.round) avoids a per-call ufunc dispatch and
+        # raises the same ValueError on nan
+        family = round(float(theta[0]))
         assert family in [1, 2], (
             "family param T={} not in [1, 2]. theta[0]={}".format(
                 family, theta[0]))
@@ -80,7 +90,9 @@ def sum_basis_funcs(basis_func, args_iterable, nfunc, x1, **kwargs):
         raise TypeError('Unexpected **kwargs: {0}'.format(kwargs))
     if adaptive:
         try:
-            sum_max = int(np.round(args_iterable[0]))
+            # round (not np.round) avoids a per-call ufunc dispatch and
+            # raises the same ValueError on nan
+            sum_max = round(float(args_iterable[0]))
             assert 1 <= sum_max <= nfunc, (
                 "sum_max={} nfunc={}".format(sum_max, nfunc))
         except ValueError:
@@ -98,18 +110,59 @@ def sum_basis_funcs(basis_func, args_iterable, nfunc, x1, **kwargs):
         args_arr = args_arr[1:]
     else:
         y = 0.0
-    # Sum basis functions
+    # Sum basis functions. The first component allocates the output array
+    # (via the scalar bias add); later components accumulate into it in
+    # place rather than allocating a fresh array per component.
     if x2 is None:
         for i in range(sum_max):
-            y += basis_func(x1, *args_arr[i::nfunc])
+            comp = basis_func(x1, *args_arr[i::nfunc])
+            if isinstance(y, np.ndarray):
+                np.add(y, comp, out=y)
+            else:
+                y = y + comp
     else:
         for i in range(sum_max):
-            y += basis_func(x1, x2, *args_arr[i::nfunc])
+            comp = basis_func(x1, x2, *args_arr[i::nfunc])
+            if isinstance(y, np.ndarray):
+                np.add(y, comp, out=y)
+            else:
+                y = y + comp
     if sigmoid:
         y = sigmoid_func(y)
     return y
 
 
+def basis_func_components(basis_func, args_iterable, nfunc, x1, x2=None):
+    """Evaluate every basis function component in one batched call.
+
+    Parameters are broadcast against a trailing component axis, so this
+    makes a single NumPy call rather than one Python call per component.
+
+    Parameters
+    ----------
+    basis_func: function
+    args_iterable: 1d array-like
+        Parameters ordered as in sum_basis_funcs (without adaptive, bias
+        or sigmoid parameters).
+    nfunc: int
+    x1: float or numpy array
+    x2: float or numpy array, optional
+
+    Returns
+    -------
+    comps: numpy array
+        Component values with shape (nfunc,) + np.shape(x1). Summing over
+        axis 0 gives the equivalent sum_basis_funcs output.
+    """
+    params = np.asarray(args_iterable).reshape(-1, nfunc)
+    if x2 is None:
+        comps = basis_func(np.asarray(x1)[..., np.newaxis], *params)
+    else:
+        comps = basis_func(np.asarray(x1)[..., np.newaxis],
+                           np.asarray(x2)[..., np.newaxis], *params)
+    return np.moveaxis(comps, -1, 0)
+
+
 def get_bf_param_names(basis_func):
     """Get a list of the parameters of the bais function (excluding x
     inputs).
@@ -5,98 +5,194 @@ Data is passed to a likelihood as a dictionary. This module also contains
 default settings for the parameters of the basis function mixture models used
 to generate results in the paper.
 """
-import copy
+import functools
 import numpy as np
 from PIL import Image
+import nestcheck.parallel_utils
 import bsr.basis_functions as bf
 
 
+# Metadata for the supported data functions: the dimension of their x
+# inputs and whether the data is loaded from an astronomical image.
+_DATA_FUNC_META = {
+    'gg_1d': {'ndim': 1},
+    'ta_1d': {'ndim': 1},
+    'gg_2d': {'ndim': 2},
+    'ta_2d': {'ndim': 2},
+    'get_image': {'ndim': 2, 'image': True}}
+
+
+# Allowed optional kwargs, checked with a single set difference rather
+# than a chain of pops
+_GENERATE_DATA_KEYS = frozenset((
+    'npoints', 'x1min', 'x1max', 'x2min', 'x2max', 'seed', 'file_dir',
+    'dtype'))
+_MAKE_GRID_KEYS = frozenset((
+    'x2_points', 'x1min', 'x1max', 'x2min', 'x2max', 'sparse', 'dtype'))
+
+
 def generate_data(data_func, data_type, y_error_sigma, x_error_sigma=None,
                   **kwargs):
     """Get data dictionary."""
-    npoints = kwargs.pop('npoints', None)
-    x1min = kwargs.pop('x1min', 0.0)
-    x1max = kwargs.pop('x1max', 1.0)
-    x2min = kwargs.pop('x2min', 0.0)
-    x2max = kwargs.pop('x2max', 1.0)
-    seed = kwargs.pop('seed', 0)
-    file_dir = kwargs.pop('file_dir', 'images/')
-    if kwargs:
-        raise TypeError('Unexpected **kwargs: {0}'.format(kwargs))
+    unexpected = kwargs.keys() - _GENERATE_DATA_KEYS
+    if unexpected:
+        raise TypeError('Unexpected **kwargs: {0}'.format(unexpected))
+    npoints = kwargs.get('npoints', None)
+    x1min = kwargs.get('x1min', 0.0)
+    x1max = kwargs.get('x1max', 1.0)
+    x2min = kwargs.get('x2min', 0.0)
+    x2max = kwargs.get('x2max', 1.0)
+    seed = kwargs.get('seed', 0)
+    file_dir = kwargs.get('file_dir', 'images/')
+    # float32 halves the memory bandwidth of the array operations; the
+    # default stays float64 as the results in the paper use it
+    dtype = kwargs.get('dtype', np.float64)
     assert callable(data_func)
     if x_error_sigma == 0:
         x_error_sigma = None  # prevents needlessly doing x error integrals
-    state = np.random.get_state()  # Save random state before seeding
-    np.random.seed(seed)
+    # Use an isolated generator rather than seeding (and having to save
+    # and restore) the process-global numpy random state
+    rng = np.random.RandomState(seed)
     data = {}
     data['random_seed'] = seed
     data['x1min'] = x1min
     data['x1max'] = x1max
     data['func'] = data_func
-    if data_func.__name__[-2:] == '1d':
+    meta = _DATA_FUNC_META[data_func.__name__]
+    if meta['ndim'] == 1:
         if npoints is None:
             npoints = 100
-        data['x1'] = (np.random.random(npoints) * (x1max - x1min)) + x1min
+        # scale and shift the uniform samples in place rather than
+        # allocating a temporary for each step
+        x1 = rng.random_sample(npoints)
+        x1 *= x1max - x1min
+        x1 += x1min
+        data['x1'] = x1.astype(dtype, copy=False)
         data['x2'] = None
         data['x2min'] = None
         data['x2max'] = None
         data['x_error_sigma'] = x_error_sigma
-    elif data_func.__name__[-2:] == '2d' or data_func.__name__ == 'get_image':
+    else:
+        assert meta['ndim'] == 2, meta
         if npoints is None:
             npoints = 32
-        data['x1'], data['x2'] = make_grid(
+        x1_sparse, x2_sparse = make_grid(
             npoints, x2_points=npoints, x1min=x1min, x2min=x2min,
-            x1max=x1max, x2max=x2max)
+            x1max=x1max, x2max=x2max, sparse=True, dtype=dtype)
+        # store broadcast views so downstream code sees full N x N grids
+        # without the memory cost; data_func is evaluated on the sparse
+        # grids, which broadcast to the full grid shape
+        data['x1'], data['x2'] = np.broadcast_arrays(x1_sparse, x2_sparse)
         data['x2min'] = x2min
         data['x2max'] = x2max
         assert x_error_sigma is None
         data['x_error_sigma'] = None  # always None in 2d
-    if data_func.__name__ == 'get_image':
-        data['y'] = get_image(data_type, npoints, file_dir=file_dir)
+    if meta.get('image', False):
+        data['y'] = get_image(data_type, npoints, file_dir=file_dir,
+                              dtype=dtype)
         data['args'] = None
         data['data_type'] = data_type
     else:
         data_func_args = get_data_args(data_func, data_type)
-        data['args'] = copy.deepcopy(data_func_args)
+        data['args'] = data_func_args.copy()
         data['data_type'] = data_type
-        data['y'] = bf.sum_basis_funcs(
-            data_func, data_func_args, data_type, data['x1'],
-            x2=data['x2'], adaptive=False)
+        # Evaluate all the mixture components in a single broadcast call
+        # (parameters as length-data_type vectors against a new trailing
+        # grid axis) rather than summing them one by one in a Python loop.
+        params = data_func_args.reshape(-1, data_type)
+        if data['x2'] is None:
+            data['y'] = data_func(
+                data['x1'][:, None], *params).sum(axis=-1)
+        else:
+            data['y'] = data_func(
+                x1_sparse[..., None], x2_sparse[..., None],
+                *params).sum(axis=-1)
+        # the float64 args upcast, so cast back if needed
+        data['y'] = data['y'].astype(dtype, copy=False)
     data['y_error_sigma'] = y_error_sigma
     data['data_name'] = get_data_name(
         data_func, data_type, npoints, y_error_sigma, x_error_sigma)
     # Add Noise
     # ---------
-    data['y_no_noise'] = copy.deepcopy(data['y'])
-    data['y'] += data['y_error_sigma'] * np.random.normal(size=data['y'].shape)
+    data['y_no_noise'] = data['y'].copy()
+    # scale the noise in place to avoid allocating a second temporary
+    noise = rng.standard_normal(data['y'].shape)
+    noise *= data['y_error_sigma']
+    data['y'] += noise
     if data['x_error_sigma'] is not None:
-        data['x1_no_noise'] = copy.deepcopy(data['x1'])
-        data['x1'] += (data['x_error_sigma'] *
-                       np.random.normal(size=data['x1'].shape))
+        data['x1_no_noise'] = data['x1'].copy()
+        noise = rng.standard_normal(data['x1'].shape)
+        noise *= data['x_error_sigma']
+        data['x1'] += noise
     else:
-        data['x1_no_noise'] = copy.deepcopy(data['x1'])
-    np.random.set_state(state)  # Reset random state
+        data['x1_no_noise'] = data['x1'].copy()
     return data
 
 
+def generate_data_batch(data_func, data_type, y_error_sigma, seeds,
+                        **kwargs):
+    """Generate data dicts for a list of random seeds.
+
+    The realisations are independent so they are mapped over a process
+    pool; parallelisation can be turned off with parallel=False. Any
+    other kwargs are passed to generate_data. Results are returned in
+    the same order as seeds.
+    """
+    parallel = kwargs.pop('parallel', True)
+    max_workers = kwargs.pop('max_workers', None)
+    assert 'seed' not in kwargs, 'seeds are specified by the seeds arg'
+    data_list = nestcheck.parallel_utils.parallel_apply(
+        _seeded_generate_data, seeds,
+        func_args=(data_func, data_type, y_error_sigma),
+        func_kwargs=kwargs, parallel=parallel, max_workers=max_workers,
+        tqdm_kwargs={'disable': True})
+    # parallel_apply does not preserve input order, so sort the results
+    # back into seed order
+    order = {seed: i for i, seed in enumerate(seeds)}
+    return sorted(data_list, key=lambda data: order[data['random_seed']])
+
+
+def _seeded_generate_data(seed, data_func, data_type, y_error_sigma,
+                          **kwargs):
+    """Helper for generate_data_batch with the seed as first arg so it can
+    be mapped over with parallel_apply."""
+    return generate_data(data_func, data_type, y_error_sigma, seed=seed,
+                         **kwargs)
+
+
 def make_grid(x1_points, **kwargs):
     """Returns grid of x1 and x2 coordinates"""
-    x2_points = kwargs.pop('x2_points', x1_points)
-    x1min = kwargs.pop('x1min', 0.0)
-    x1max = kwargs.pop('x1max', 1.0)
-    x2min = kwargs.pop('x2min', 0.0)
-    x2max = kwargs.pop('x2max', 1.0)
-    if kwargs:
-        raise TypeError('Unexpected **kwargs: {0}'.format(kwargs))
-    x1_setup = np.linspace(x1min, x1max, num=x1_points)
+    unexpected = kwargs.keys() - _MAKE_GRID_KEYS
+    if unexpected:
+        raise TypeError('Unexpected **kwargs: {0}'.format(unexpected))
+    x2_points = kwargs.get('x2_points', x1_points)
+    x1min = kwargs.get('x1min', 0.0)
+    x1max = kwargs.get('x1max', 1.0)
+    x2min = kwargs.get('x2min', 0.0)
+    x2max = kwargs.get('x2max', 1.0)
+    sparse = kwargs.get('sparse', False)
+    dtype = kwargs.get('dtype', np.float64)
+    x1_setup = np.linspace(x1min, x1max, num=x1_points, dtype=dtype)
     # flip x2 order to have y increacing on plots' verticle axis
-    x2_setup = np.linspace(x2min, x2max, num=x2_points)[::-1]
-    x1_grid, x2_grid = np.meshgrid(x1_setup, x2_setup)
+    x2_setup = np.linspace(x2min, x2max, num=x2_points, dtype=dtype)[::-1]
+    # sparse grids are (1, N) and (N, 1) views which broadcast against each
+    # other, avoiding the memory cost of two full N x N arrays
+    x1_grid, x2_grid = np.meshgrid(x1_setup, x2_setup, sparse=sparse)
     return x1_grid, x2_grid
 
 
-def get_image(data_type, side_size, file_dir='images/'):
-    """Load image from file into array format."""
+def get_image(data_type, side_size, file_dir='images/', dtype=np.float64):
+    """Load image from file into array format.
+
+    Results are cached, so repeated requests for the same image and size
+    skip the file read and resize. A copy is returned as callers (e.g.
+    generate_data) add noise to the array in place."""
+    return _load_image(data_type, side_size, file_dir, dtype).copy()
+
+
+@functools.lru_cache(maxsize=16)
+def _load_image(data_type, side_size, file_dir, dtype):
+    """Uncached worker for get_image."""
     assert isinstance(data_type, int)
     filename = 'xdf_crop_{}.jpeg'.format(data_type)
     # open image and resize it
@@ -104,26 +200,31 @@ def get_image(data_type, side_size, file_dir='images/'):
     im_fullsize = Image.open(file_dir + filename)
     # convert to greyscale
     im_fullsize = im_fullsize.convert('L')
-    pixels_fullsize = np.zeros(im_fullsize.size)
-    for (x, y), _ in np.ndenumerate(pixels_fullsize):
-        pixels_fullsize[x, y] = im_fullsize.getpixel((x, y))
-    pixels_fullsize *= 1.0 / 256
-    im = im_fullsize.resize(size, Image.ANTIALIAS)
-    pixels = np.zeros(size)
-    for (x, y), _ in np.ndenumerate(pixels):
-        pixels[x, y] = im.getpixel((x, y))
+    # NB Image.ANTIALIAS was an alias of LANCZOS and was removed in
+    # Pillow 10
+    im = im_fullsize.resize(size, Image.LANCZOS)
+    pixels = _image_to_pixels(im, dtype=dtype)
+    return pixels
+
+
+def _image_to_pixels(im, dtype=np.float64):
+    """Extract a greyscale ('L' mode) image's pixels with a single buffer
+    copy rather than any per-pixel calls. im.size is (width, height), so
+    reshape to (height, width) then transpose to keep (x, y) indexing."""
+    pixels = np.frombuffer(im.tobytes(), dtype=np.uint8)
+    pixels = pixels.reshape(im.size[1], im.size[0]).T.astype(dtype)
     pixels *= 1.0 / 256
     return pixels
 
 
 def get_data_name(data_func, data_type, npoints, y_error_sigma, x_error_sigma):
     """Standard string describing data for save names."""
-    data_name = '{}_{}'.format(data_func.__name__, data_type)
-    if data_func.__name__ != 'get_image':
-        data_name += 'funcs'
-    data_name += '_{}pts_{}ye'.format(npoints, y_error_sigma)
-    if x_error_sigma is not None:
-        data_name += '_{}xe'.format(x_error_sigma)
+    func_name = data_func.__name__
+    data_name = '{}_{}{}_{}pts_{}ye{}'.format(
+        func_name, data_type,
+        '' if func_name == 'get_image' else 'funcs',
+        npoints, y_error_sigma,
+        '' if x_error_sigma is None else '_{}xe'.format(x_error_sigma))
     return data_name.replace('.', '_')
 
 
@@ -142,62 +243,57 @@ def get_true_value(data_func, data_type, x1=0.5, x2=None):
 
 # Set up data
 # -----------
+# Default arguments for generating data, keyed by (data function name,
+# number of mixture components). In each case the first arg is sorted.
+_DATA_ARGS = {
+    ('gg_1d', 1): [{'a': 0.75, 'mu': 0.4, 'sigma': 0.3, 'beta': 2.0}],
+    ('gg_1d', 2): [{'a': 0.2, 'mu': 0.4, 'sigma': 0.6, 'beta': 5.0},
+                   {'a': 0.55, 'mu': 0.4, 'sigma': 0.2, 'beta': 4.0}],
+    ('gg_1d', 3): [{'a': 0.2, 'mu': 0.4, 'sigma': 0.6, 'beta': 5.0},
+                   {'a': 0.35, 'mu': 0.6, 'sigma': 0.07, 'beta': 2.0},
+                   {'a': 0.55, 'mu': 0.32, 'sigma': 0.14, 'beta': 6.0}],
+    ('gg_1d', 4): [{'a': 0.2, 'mu': 0.3, 'sigma': 0.5, 'beta': 5.0},
+                   {'a': 0.4, 'mu': 0.65, 'sigma': 0.07, 'beta': 2.0},
+                   {'a': 0.6, 'mu': 0.25, 'sigma': 0.1, 'beta': 6.0},
+                   {'a': 0.9, 'mu': 0.95, 'sigma': 0.1, 'beta': 6.0}],
+    ('ta_1d', 1): [{'a': 0.8, 'w_0': 0.0, 'w_1': 1.5}],
+    ('ta_1d', 2): [{'a': 0.7, 'w_0': -1, 'w_1': 3},
+                   {'a': 0.9, 'w_0': 2, 'w_1': -3}],
+    ('ta_1d', 3): [{'a': 0.6, 'w_0': -7, 'w_1': 8},
+                   {'a': 1, 'w_0': -1, 'w_1': 3},
+                   {'a': 1.4, 'w_0': 2, 'w_1': -3}],
+    # the gg_2d order is (with first arg sorted):
+    # [a_1, mu1_1, mu2_1, s1_1, s2_1, b1_1, b2_1, rot angle]
+    ('gg_2d', 1): [{'a': 0.8, 'mu1': 0.6, 'mu2': 0.6, 'sigma1': 0.1,
+                    'sigma2': 0.2, 'beta1': 2, 'beta2': 2,
+                    'omega': 0.1 * np.pi}],
+    ('gg_2d', 2): [{'a': 0.5, 'mu1': 0.5, 'mu2': 0.4, 'sigma1': 0.4,
+                    'sigma2': 0.2, 'beta1': 2, 'beta2': 2, 'omega': 0},
+                   {'a': 0.8, 'mu1': 0.5, 'mu2': 0.6, 'sigma1': 0.1,
+                    'sigma2': 0.1, 'beta1': 2, 'beta2': 2, 'omega': 0}],
+    ('gg_2d', 3): [{'a': 0.5, 'mu1': 0.3, 'mu2': 0.7, 'sigma1': 0.2,
+                    'sigma2': 0.2, 'beta1': 2, 'beta2': 2, 'omega': 0},
+                   {'a': 0.7, 'mu1': 0.7, 'mu2': 0.6, 'sigma1': 0.15,
+                    'sigma2': 0.15, 'beta1': 2, 'beta2': 2, 'omega': 0},
+                   {'a': 0.9, 'mu1': 0.4, 'mu2': 0.3, 'sigma1': 0.1,
+                    'sigma2': 0.1, 'beta1': 2, 'beta2': 2, 'omega': 0}]}
+
+
+@functools.lru_cache(maxsize=None)
+def _bf_param_names(data_func):
+    """Cached wrapper for bf.get_bf_param_names, as signature introspection
+    is relatively slow and the result never changes for a given function."""
+    return tuple(bf.get_bf_param_names(data_func))
+
+
 def get_data_args(data_func, nfuncs):
     """Returns default arguments for generating data."""
-    if data_func.__name__ == 'gg_1d':
-        # first arg is sorted
-        if nfuncs == 1:
-            data_args = [{'a': 0.75, 'mu': 0.4, 'sigma': 0.3, 'beta': 2.0}]
-        elif nfuncs == 2:
-            data_args = [{'a': 0.2, 'mu': 0.4, 'sigma': 0.6, 'beta': 5.0},
-                         {'a': 0.55, 'mu': 0.4, 'sigma': 0.2, 'beta': 4.0}]
-        elif nfuncs == 3:
-            data_args = [{'a': 0.2, 'mu': 0.4, 'sigma': 0.6, 'beta': 5.0},
-                         {'a': 0.35, 'mu': 0.6, 'sigma': 0.07, 'beta': 2.0},
-                         {'a': 0.55, 'mu': 0.32, 'sigma': 0.14, 'beta': 6.0}]
-        elif nfuncs == 4:
-            data_args = [{'a': 0.2, 'mu': 0.3, 'sigma': 0.5, 'beta': 5.0},
-                         {'a': 0.4, 'mu': 0.65, 'sigma': 0.07, 'beta': 2.0},
-                         {'a': 0.6, 'mu': 0.25, 'sigma': 0.1, 'beta': 6.0},
-                         {'a': 0.9, 'mu': 0.95, 'sigma': 0.1, 'beta': 6.0}]
-    elif data_func.__name__ == 'ta_1d':
-        # first arg is sorted
-        if nfuncs == 1:
-            data_args = [{'a': 0.8, 'w_0': 0.0, 'w_1': 1.5}]
-        elif nfuncs == 2:
-            data_args = [{'a': 0.7, 'w_0': -1, 'w_1': 3},
-                         {'a': 0.9, 'w_0': 2, 'w_1': -3}]
-        elif nfuncs == 3:
-            data_args = [
-                {'a': 0.6, 'w_0': -7, 'w_1': 8},
-                {'a': 1, 'w_0': -1, 'w_1': 3},
-                {'a': 1.4, 'w_0': 2, 'w_1': -3}]
-    elif data_func.__name__ == 'gg_2d':
-        # the order is (with first arg sorted):
-        # [a_1, mu1_1, mu2_1, s1_1, s2_1, b1_1, b2_1, rot angle]
-        if nfuncs == 1:
-            data_args = [
-                {'a': 0.8, 'mu1': 0.6, 'mu2': 0.6, 'sigma1': 0.1,
-                 'sigma2': 0.2, 'beta1': 2, 'beta2': 2, 'omega': 0.1 * np.pi}]
-        elif nfuncs == 2:
-            data_args = [
-                {'a': 0.5, 'mu1': 0.5, 'mu2': 0.4, 'sigma1': 0.4,
-                 'sigma2': 0.2, 'beta1': 2, 'beta2': 2, 'omega': 0},
-                {'a': 0.8, 'mu1': 0.5, 'mu2': 0.6, 'sigma1': 0.1,
-                 'sigma2': 0.1, 'beta1': 2, 'beta2': 2, 'omega': 0}]
-        elif nfuncs == 3:
-            data_args = [
-                {'a': 0.5, 'mu1': 0.3, 'mu2': 0.7, 'sigma1': 0.2,
-                 'sigma2': 0.2, 'beta1': 2, 'beta2': 2, 'omega': 0},
-                {'a': 0.7, 'mu1': 0.7, 'mu2': 0.6, 'sigma1': 0.15,
-                 'sigma2': 0.15, 'beta1': 2, 'beta2': 2, 'omega': 0},
-                {'a': 0.9, 'mu1': 0.4, 'mu2': 0.3, 'sigma1': 0.1,
-                 'sigma2': 0.1, 'beta1': 2, 'beta2': 2, 'omega': 0}]
     try:
-        data_args_list = []
-        for name in bf.get_bf_param_names(data_func):
-            data_args_list += [d[name] for d in data_args]
-        return data_args_list
-    except NameError:
+        data_args = _DATA_ARGS[(data_func.__name__, nfuncs)]
+    except KeyError:
         raise AssertionError('no data args found! func={} nfuncs={}'.format(
             data_func.__name__, nfuncs))
+    # return as a flat array (parameter-major, so arr[i::nfuncs] selects
+    # the i-th component's parameters, matching sum_basis_funcs)
+    return np.asarray([d[name] for name in _bf_param_names(data_func)
+                       for d in data_args])
@@ -29,6 +29,10 @@ import bsr.basis_functions as bf
 import bsr.neural_networks as nn
 
 
+# Precomputed as log_gaussian_given_r runs once per likelihood call
+_LOG_2PI = np.log(2 * np.pi)
+
+
 class FittingLikelihood(object):
 
     """Loglikelihood for fitting basis functions or neural networks to data."""
@@ -44,6 +48,16 @@ class FittingLikelihood(object):
         self.data = data
         assert data['x_error_sigma'] is None or data['x2'] is None, (
             'Not yet set up to deal with x errors in 2d')
+        # Cache the numeric fields used in __call__ as attributes; the
+        # dict stays the data interchange format but attribute access
+        # avoids repeated key hashing in the per-sample hot loop
+        self._x1 = data['x1']
+        self._x2 = data['x2']
+        self._y = data['y']
+        self._y_error_sigma = data['y_error_sigma']
+        self._x_error_sigma = data['x_error_sigma']
+        self._x1min = data['x1min']
+        self._x1max = data['x1max']
         self.function = function
         self.nfunc = nfunc
         if self.function.__name__[:2] == 'nn':
@@ -270,39 +284,39 @@ class FittingLikelihood(object):
         assert theta.shape == (self.ndim,), (
             'theta.shape={0} != (self.ndim,)=({1},)'.format(
                 theta.shape, self.ndim))
-        if self.data['x_error_sigma'] is None:
+        if self._x_error_sigma is None:
             # No x errors so no need to integrate
-            ytheta = self.fit(theta, self.data['x1'], self.data['x2'])
+            ytheta = self.fit(theta, self._x1, self._x2)
             logl = np.sum(log_gaussian_given_r(
-                abs(ytheta - self.data['y']), self.data['y_error_sigma']))
+                abs(ytheta - self._y), self._y_error_sigma))
         else:
             # x errors require integration
             # First calculate normalisation constants for all points'
             # contributions in one go
-            logl = -np.log(2 * np.pi * self.data['y_error_sigma']
-                           * self.data['x_error_sigma']
-                           * (self.data['x1max'] - self.data['x1min']))
-            logl *= self.data['y'].size
+            logl = -np.log(2 * np.pi * self._y_error_sigma
+                           * self._x_error_sigma
+                           * (self._x1max - self._x1min))
+            logl *= self._y.size
             # Now integrate:
             # number of points needs to be high (~1000) or polychord gives the
             # 'nondeterministic likelihood' warning as likelihoods evaluate
             # inconsistently due to rounding errors on the integration
             nsamp = 501
-            dx = (self.data['x1max'] - self.data['x1min']) / (nsamp - 1)
-            X = np.linspace(self.data['x1min'], self.data['x1max'], nsamp)
+            dx = (self._x1max - self._x1min) / (nsamp - 1)
+            X = np.linspace(self._x1min, self._x1max, nsamp)
             Y = self.fit(theta, X)
             # Vectorise the integral by making an array in which each row
             # is the integrand for one data point using broadcasting
             X = X.reshape((1, X.shape[0]))
             Y = Y.reshape((1, Y.shape[0]))
-            xdat = self.data['x1'].reshape((self.data['x1'].shape[0], 1))
-            ydat = self.data['y'].reshape((self.data['y'].shape[0], 1))
-            expo = ((xdat - X) / self.data['x_error_sigma']) ** 2
-            expo += ((ydat - Y) / self.data['y_error_sigma']) ** 2
+            xdat = self._x1.reshape((self._x1.shape[0], 1))
+            ydat = self._y.reshape((self._y.shape[0], 1))
+            expo = ((xdat - X) / self._x_error_sigma) ** 2
+            expo += ((ydat - Y) / self._y_error_sigma) ** 2
             expo = np.exp(-0.5 * expo)
-            assert expo.shape == (self.data['y'].shape[0], nsamp)
+            assert expo.shape == (self._y.shape[0], nsamp)
             contributions = rowwise_simpson(expo, dx=dx)
-            assert contributions.shape == (self.data['y'].shape[0],)
+            assert contributions.shape == (self._y.shape[0],)
             if np.any(contributions == 0):
                 logl = -np.inf
             else:
@@ -328,7 +342,7 @@ def log_gaussian_given_r(r, sigma, n_dim=1):
     logl = -0.5 * ((r ** 2) / (sigma ** 2))
     # normalise
     logl -= n_dim * np.log(sigma)
-    logl -= np.log(2 * np.pi) * (n_dim / 2.0)
+    logl -= _LOG_2PI * (n_dim / 2.0)
     return logl
 
 def cpp_format_array(array):
@@ -60,7 +60,9 @@ def nn_adl(x, params, n_nodes, **kwargs):
     """Neural network with adaptive number of hidden layers."""
     assert kwargs.get('adaptive')
     try:
-        nlayer = int(np.round(params[0]))
+        # round (not np.round) avoids a per-call ufunc dispatch and
+        # raises the same ValueError on nan
+        nlayer = round(float(params[0]))
         assert nlayer in [1, 2], (
             "nlayer param T={} not in [1, 2]. theta[0]={}".format(
                 nlayer, params[0]))
@@ -90,7 +92,7 @@ def adaptive_theta(theta, n_nodes):
     """Return a theta vector with the nodes that are not used zeroed out."""
     assert theta.shape == (1 + nn_num_params(n_nodes),)
     try:  # pylint: disable=too-many-nested-blocks
-        nfunc = int(np.round(theta[0]))
+        nfunc = round(float(theta[0]))
         theta = copy.deepcopy(theta[1:])  # deepcopy needed for PolyChord
         assert 1 <= nfunc <= n_nodes[-1], nfunc
         for node in range(nfunc, n_nodes[-1]):
@@ -1,10 +1,25 @@
 #!/usr/bin/env python
 """Functions for plotting the results."""
-import copy
+# pylint: disable=wrong-import-position
+import collections
+import functools
+import hashlib
+import logging
+import os
 import warnings
 import numpy as np
+import scipy.stats
 import matplotlib
+if os.environ.get('BSR_BACKEND'):
+    matplotlib.use(os.environ['BSR_BACKEND'])
+elif not os.environ.get('DISPLAY'):
+    # Use the non-interactive Agg backend when running headless - it avoids
+    # loading a GUI toolkit and is much faster per figure. Must set this
+    # before pyplot import.
+    matplotlib.use('Agg')
+import matplotlib.collections
 import matplotlib.gridspec as gridspec
+import matplotlib.patches
 import matplotlib.pyplot as plt
 import fgivenx
 import fgivenx.plot
@@ -18,6 +33,9 @@ import bsr.results_utils
 import bsr.results_tables
 
 
+LOG = logging.getLogger(__name__)
+
+
 def plot_bars(df, **kwargs):
     """Make a bar chart of vanilla and adaptive Bayes factors, including their
     error bars."""
@@ -45,38 +63,59 @@ def plot_bars(df, **kwargs):
     ind = np.arange(len(df.columns))  # the x locations for the groups
     bars = []
     labels = []
+    # Extract the (method, result type) blocks as arrays up front - one
+    # sorted-index cross section each instead of three MultiIndex lookups
+    # per method inside the loop
+    df = df.sort_index()
+    values_arr = df.xs(('combined', 'value'), level=(1, 2)).reindex(
+        method_list).to_numpy()
+    unc_arr = df.xs(('combined', 'uncertainty'), level=(1, 2)).reindex(
+        method_list).to_numpy()
+    if max_unc:
+        try:
+            unc_sep = df.xs(('sep mean', 'uncertainty'), level=(1, 2)).reindex(
+                method_list).to_numpy()
+            # fmax rather than maximum so methods without a sep mean row
+            # (NaN after reindex) keep their combined uncertainty
+            unc_arr = np.fmax(unc_arr, unc_sep)
+        except KeyError:
+            print('key error for', ('sep mean', 'uncertainty'))
+    if log_ratios:
+        values_arr = values_arr - values_arr.max(axis=1, keepdims=True)
     fig, ax = plt.subplots(figsize=figsize)
+    # Draw all bars as a single PatchCollection plus one errorbar call
+    # rather than one BarContainer of individual Rectangle artists per
+    # method - batched rendering keeps the artist count constant however
+    # many methods and columns there are
+    bar_lefts = ind[np.newaxis, :] + bar_centres[:, np.newaxis]
+    bar_lefts -= 0.5 * bar_width
+    rects = []
+    rect_colors = []
     for i, method in enumerate(method_list):
         labels.append(bsr.results_utils.label_given_method_str(method))
-        # plot bar
-        values = df.loc[(method, 'combined', 'value')].values
-        if log_ratios:
-            values -= values.max()
-        unc = df.loc[(method, 'combined', 'uncertainty')].values
-        if max_unc:
-            try:
-                unc_sep_key = (method, 'sep mean', 'uncertainty')
-                unc_sep = df.loc[unc_sep_key].values
-                unc = np.maximum(unc, unc_sep)
-            except KeyError:
-                print('key error for', unc_sep_key)
-        bars.append(ax.bar(
-            ind + bar_centres[i], values, bar_width,
-            yerr=unc, color=colors[i]))
+        # proxy artist for the legend
+        bars.append(matplotlib.patches.Patch(color=colors[i]))
+        for left, value in zip(bar_lefts[i], values_arr[i]):
+            rects.append(matplotlib.patches.Rectangle(
+                (left, 0.0), bar_width, value))
+        rect_colors += [colors[i]] * len(ind)
+    ax.add_collection(matplotlib.collections.PatchCollection(
+        rects, facecolors=rect_colors))
+    ax.errorbar(
+        (bar_lefts + 0.5 * bar_width).ravel(), values_arr.ravel(),
+        yerr=unc_arr.ravel(), fmt='none', ecolor='black')
     ax.set_xticks(ind)
     if adfam:
         assert len(df.columns) % 2 == 0, len(df.columns)
         n_per_fam = len(df.columns) // 2
-        xlabels = []
-        for t in [1, 2]:
-            for b in range(1 + exclude_n_le, n_per_fam + 1 + exclude_n_le):
-                xlabels.append('{},{}'.format(t, b))
+        xlabels = ['{},{}'.format(t, b) for t in [1, 2] for b in
+                   range(1 + exclude_n_le, n_per_fam + 1 + exclude_n_le)]
         fig.axes[0].set_xticklabels(xlabels)
         fig.axes[0].axvline(x=n_per_fam - 0.5, color='black', linestyle=':')
         if nn_xlabel:
             ax.set_xlabel('hidden layers and nodes per layer $L,N$')
             ax.set_xlim(-0.5, len(xlabels) - 0.5)
-            print(fig.axes[0].get_xlim())
+            LOG.debug('xlim: %s', fig.axes[0].get_xlim())
         else:
             ax.set_ylabel('family and number $T,N$')
     else:
@@ -111,7 +150,7 @@ def plot_bars(df, **kwargs):
     shrink = 0.6
     labels = [lab.replace('dynamic adaptive', 'dyn. adap.') for lab in labels]
     ax.legend(
-        [ba[0] for ba in bars], labels,
+        bars, labels,
         prop={'size': matplotlib.rcParams.get('font.size') - 1},
         labelspacing=matplotlib.rcParams.get('legend.labelspacing') * shrink,
         handlelength=matplotlib.rcParams.get('legend.handlelength') * shrink,
@@ -127,6 +166,7 @@ def plot_runs(likelihood_list, run_list, nfunc_list=None, **kwargs):
     adfam = kwargs.get('adfam', False)
     adfam_nn = kwargs.pop('adfam_nn', False)
     true_signal = kwargs.pop('true_signal', True)
+    check_data = kwargs.pop('check_data', True)
     if not isinstance(likelihood_list, list):
         likelihood_list = [likelihood_list]
     if not isinstance(run_list, list):
@@ -139,12 +179,18 @@ def plot_runs(likelihood_list, run_list, nfunc_list=None, **kwargs):
             kwargs.get('combine', True), nfunc_list, adfam=adfam,
             true_signal=true_signal, adfam_nn=adfam_nn)
     if len(likelihood_list) >= 1:
-        for like in likelihood_list[1:]:
-            try:
-                assert like.data == likelihood_list[0].data
-            except ValueError:
-                print('ValueError comparing data')
-        kwargs['data'] = likelihood_list[0].data
+        data = likelihood_list[0].data
+        if check_data and len(likelihood_list) > 1:
+            # Likelihoods are normally constructed sharing one data dict,
+            # so check identity first; otherwise compare a hash of the y
+            # array computed once, rather than elementwise == on every
+            # array in the data dicts
+            y_hash = hash(data['y'].tobytes())
+            for like in likelihood_list[1:]:
+                assert (like.data is data
+                        or hash(like.data['y'].tobytes()) == y_hash), (
+                            'likelihoods have different data')
+        kwargs['data'] = data
     if kwargs['data']['y'].ndim == 1:
         fig = plot_1d_runs(likelihood_list, run_list, nfunc_list=nfunc_list,
                            **kwargs)
@@ -210,21 +256,29 @@ def plot_2d_runs(likelihood_list, run_list, **kwargs):
             samp_nfuncs = np.round(run['theta'][:, 0]).astype(int)
             nfunc_list = kwargs.pop('nfunc_list', list(np.unique(samp_nfuncs)))
             logw = nestcheck.ns_run_utils.get_logw(run)
+            # One stable sort, then each nfunc's samples are a contiguous
+            # slice, rather than scanning every sample once per nfunc
+            order = np.argsort(samp_nfuncs, kind='stable')
+            sorted_nfuncs = samp_nfuncs[order]
+            theta_sorted = run['theta'][order]
+            logw_sorted = logw[order]
             for nf in nfunc_list:
-                inds = np.where(samp_nfuncs == nf)[0]
-                w_rel = logw[inds]
+                start, end = np.searchsorted(sorted_nfuncs, [nf, nf + 1])
+                w_rel = logw_sorted[start:end]
                 # exp after selecting inds to avoid overflow
                 w_rel = np.exp(w_rel - w_rel.max())
                 y_list.append(likelihood_list[0].fit_mean(
-                    run['theta'][inds, :], data['x1'],
+                    theta_sorted[start:end], data['x1'],
                     data['x2'], w_rel=w_rel))
         else:
             for i, run in enumerate(run_list):
                 w_rel = nestcheck.ns_run_utils.get_w_rel(run)
                 y_list.append(likelihood_list[i].fit_mean(
                     run['theta'], data['x1'], data['x2'], w_rel=w_rel))
-    print('ymax:', [y.max() for y in y_list])
-    print('ymin:', [y.min() for y in y_list])
+    if LOG.isEnabledFor(logging.DEBUG):
+        # guarded so the full array reductions only run when debugging
+        LOG.debug('ymax: %s', [y.max() for y in y_list])
+        LOG.debug('ymin: %s', [y.min() for y in y_list])
     return plot_colormap(y_list, data['x1'], data['x2'], **kwargs)
 
 
@@ -271,16 +325,46 @@ def plot_colormap(y_list, x1, x2, **kwargs):
         nrow, ncol + 1,
         width_ratios=[colorbar_aspect] * ncol + [1],
         height_ratios=[1] * nrow)
+    # Uniform grids (the usual case) can be drawn with imshow - a single
+    # raster blit rather than one quad per pixel, which is much faster and
+    # gives smaller files than rasterized pcolormesh. Check uniformity once.
+    step1 = np.diff(x1[0, :])
+    step2 = np.diff(x2[:, 0])
+    uniform = (np.allclose(step1, step1[0])
+               and np.allclose(step2, step2[0]))
+    if uniform:
+        # extent covers the pixel edges, half a step beyond the centres.
+        # origin='upper' puts row 0 at the top coordinate, matching the
+        # descending x2 grids make_grid produces
+        extent = (x1[0, 0] - 0.5 * step1[0], x1[0, -1] + 0.5 * step1[0],
+                  x2[-1, 0] + 0.5 * step2[0], x2[0, 0] - 0.5 * step2[0])
+    # Create all axes up front - the main grid plus one colorbar axes per
+    # occupied row - so drawing is decoupled from axes creation. All
+    # colormap axes are identical [0, 1] squares, so share both axes and
+    # let matplotlib skip re-initialising tick state per axes.
+    axes = []
+    share_ax = None
+    for i in range(len(y_list)):
+        share_ax = fig.add_subplot(gs[i // ncol, i % ncol],
+                                   sharex=share_ax, sharey=share_ax)
+        axes.append(share_ax)
+    nrow_used = int(np.ceil(len(y_list) / ncol))
+    cbar_axes = [fig.add_subplot(gs[row, -1]) for row in range(nrow_used)]
     for i, y in enumerate(y_list):
         col = i % ncol
         row = i // ncol
-        ax = plt.subplot(gs[row, col])
-        # NB: I can't get rid of the white lines between pixels without
-        # rasterized=True. Also white strip at bottom can only be removed by
-        # increasing the dpi
-        im = ax.pcolormesh(x1, x2, y, vmin=0, vmax=1,
-                           rasterized=True, snap=True,
-                           edgecolor='face', linewidth=0.0)
+        ax = axes[i]
+        if uniform:
+            im = ax.imshow(y, vmin=0, vmax=1, extent=extent,
+                           origin='upper', aspect='auto',
+                           interpolation='nearest')
+        else:
+            # NB: I can't get rid of the white lines between pixels without
+            # rasterized=True. Also white strip at bottom can only be removed
+            # by increasing the dpi
+            im = ax.pcolormesh(x1, x2, y, vmin=0, vmax=1,
+                               rasterized=True, snap=True,
+                               edgecolor='face', linewidth=0.0)
         ax.set_xticks([])
         ax.set_xticklabels([])
         ax.set_yticks([])
@@ -293,8 +377,7 @@ def plot_colormap(y_list, x1, x2, **kwargs):
             ax.set_xlabel('$x_1$')
         if col == 0:
             ax.set_ylabel('$x_2$')
-            cax = plt.subplot(gs[row, -1])
-            plt.colorbar(im, cax=cax)
+            plt.colorbar(im, cax=cbar_axes[row])
         if titles is not None:
             ax.set_title(titles[i])
     if all([t[0] == '$' for t in titles]):
@@ -315,18 +398,31 @@ def plot_1d_adaptive_multi(func, run, **kwargs):
         nfam_list = [1, 2]
     else:
         nfam_list = [None]
-    inds_list = []
-    for nfam in nfam_list:
-        for nfunc in nfunc_list:
-            inds_list.append(bsr.results_tables.select_adaptive_inds(
-                run['theta'], nfunc, nfam=nfam))
-    logw = nestcheck.ns_run_utils.get_logw(run)
+    theta = run['theta']
+    if adfam:
+        samp_nfam = np.round(theta[:, 0]).astype(int)
+        samp_nfunc = np.round(theta[:, 1]).astype(int)
+    else:
+        samp_nfam = np.zeros(theta.shape[0], dtype=int)
+        samp_nfunc = np.round(theta[:, 0]).astype(int)
+    # Composite (T, N) keys mean one stable sort replaces a boolean scan
+    # of every sample per subplot; each subplot's samples are then a
+    # contiguous slice found with searchsorted
+    base = max(int(samp_nfunc.max()), max(nfunc_list)) + 1
+    keys = samp_nfam * base + samp_nfunc
+    order = np.argsort(keys, kind='stable')
+    keys_sorted = keys[order]
+    theta_sorted = theta[order]
+    logw_sorted = nestcheck.ns_run_utils.get_logw(run)[order]
     samples = []
     weights = []
-    for inds in inds_list:
-        samples.append(run['theta'][inds, :])
-        logw_temp = logw[inds]
-        weights.append(np.exp(logw_temp - logw_temp.max()))
+    for nfam in nfam_list:
+        for nfunc in nfunc_list:
+            key = (0 if nfam is None else nfam) * base + nfunc
+            start, end = np.searchsorted(keys_sorted, [key, key + 1])
+            samples.append(theta_sorted[start:end])
+            logw_temp = logw_sorted[start:end]
+            weights.append(np.exp(logw_temp - logw_temp.max()))
     return plot_1d_grid([func] * len(samples), samples, weights, **kwargs)
 
 
@@ -354,35 +450,75 @@ def plot_1d_grid(funcs, samples, weights, **kwargs):  # pylint: disable=too-many
     data_color = kwargs.pop('data_color', 'darkred')
     subplot_height = kwargs.pop('subplot_height', 1.05)
     subplot_width = kwargs.pop('subplot_width', 1.05)
+    colormap = kwargs.pop('colormap', plt.get_cmap('Reds_r'))
+    smooth = kwargs.pop('smooth', False)
+    rasterize_contours = kwargs.pop('rasterize_contours', False)
+    parallel = kwargs.pop('parallel', True)
+    fig = kwargs.pop('fig', None)
     kwargs.pop('adfam', None)  # remove as no longer needed
     # ncolorbar = kwargs.pop('ncolorbar', 1)
+    # Compute the fgivenx PMF grids for all subplots up front, spread over
+    # processes. This parallelises over subplots rather than within each
+    # compute_pmf call, which scales better when there are many subplots.
+    pmf_results = nestcheck.parallel_utils.parallel_apply(
+        _compute_pmf_worker,
+        [(i, funcs[i], samples[i], weights[i], logzs[i])
+         for i in range(len(funcs))],
+        func_args=(x,), func_kwargs=kwargs, parallel=parallel)
+    pmf_list = [None] * len(funcs)
+    for ind, pmf_result, messages in pmf_results:
+        pmf_list[ind] = pmf_result
+        # Re-issue warnings captured in the worker processes so they are
+        # visible (and filterable) in the caller's context
+        for message in messages:
+            warnings.warn(message, UserWarning)
     # Make figure
     gs = gridspec.GridSpec(
         nrow, ncol + 1, width_ratios=[colorbar_aspect] * ncol + [1],
         height_ratios=[1] * nrow)
-    fig = kwargs.pop('fig', None)
     if fig is None:
         fig = plt.figure(figsize=figsize)
+        # Share x within each column and y within each row so matplotlib
+        # links limits and tick state between axes rather than setting up
+        # every axes from scratch. Sharing x per column (not globally)
+        # keeps the per-column tick pruning below working, as shared axes
+        # use a single locator.
+        col_share = [None] * ncol
+        row_share = [None] * nrow
         for i in range(nplots):
             col = i % ncol
             row = i // ncol
-            ax = plt.subplot(gs[row, col])
+            ax = fig.add_subplot(gs[row, col], sharex=col_share[col],
+                                 sharey=row_share[row])
+            if col_share[col] is None:
+                col_share[col] = ax
+            if row_share[row] is None:
+                row_share[row] = ax
+    # fig.axes rebuilds its list on every access, so grab it once rather
+    # than once per subplot
+    axes_list = list(fig.axes)
     cbar_list = []  # for storing colorbars
+    # Only two locator variants are needed (pruned for all but the last
+    # column, unpruned for the last), and every axes has the same x
+    # limits, so construct them once and reuse rather than allocating a
+    # locator per subplot
+    loc_pruned = matplotlib.ticker.MaxNLocator(nbins=5, prune='upper')
+    loc_unpruned = matplotlib.ticker.MaxNLocator(nbins=5, prune=None)
     for i in range(nplots):
-        ax = fig.axes[i]
+        ax = axes_list[i]
         col = i % ncol
         row = i // ncol
         # If plot_data we also want to plot the true function and the
         # noisy data, and need to shift the other plots along
         if plot_data and i == 0:
-            if data['data_type'] != 1:
-                for nf in range(data['data_type']):
-                    if data['func'].__name__[:2] != 'nn':
-                        comp = data['func'](
-                            x, *data['args'][nf::data['data_type']])
-                        ax.plot(x, comp, color=data_color, linestyle=':')
+            if data['data_type'] != 1 and data['func'].__name__[:2] != 'nn':
+                # evaluate all components in one batched call and plot
+                # them with a single plot call (one column per line)
+                comps = bf.basis_func_components(
+                    data['func'], data['args'], data['data_type'], x)
+                ax.plot(x, comps.T, color=data_color, linestyle=':')
             y_true = bf.sum_basis_funcs(
-                data['func'], np.asarray(copy.deepcopy(data['args'])),
+                data['func'], np.array(data['args'], dtype=np.float64),
                 data['data_type'], x)
             ax.plot(x, y_true, color=data_color)
         elif plot_data and i == 1:
@@ -390,15 +526,15 @@ def plot_1d_grid(funcs, samples, weights, **kwargs):  # pylint: disable=too-many
                         xerr=data['x_error_sigma'], fmt='none',
                         ecolor=data_color)
         elif plot_data:  # for i >= 2
-            cbar_list.append(fgivenx_plot(
-                funcs[i - 2], x, samples[i - 2], ax, weights=weights[i - 2],
-                logzs=logzs[i - 2], y=x, **kwargs))
+            cbar_list.append(_render_pmf(
+                ax, x, pmf_list[i - 2], colormap=colormap, smooth=smooth,
+                rasterize_contours=rasterize_contours))
             # # plot MAP
             # ax.plot(x, funcs[i - 2](x, samples[i - 2][-1, :]), color='black')
         else:
-            cbar_list.append(fgivenx_plot(
-                funcs[i], x, samples[i], ax, weights=weights[i],
-                logzs=logzs[i], y=x, **kwargs))
+            cbar_list.append(_render_pmf(
+                ax, x, pmf_list[i], colormap=colormap, smooth=smooth,
+                rasterize_contours=rasterize_contours))
             # # plot MAP
             # ax.plot(x, funcs[i](x, samples[i][-1, :]), color='black')
         if col == 0:
@@ -407,18 +543,18 @@ def plot_1d_grid(funcs, samples, weights, **kwargs):  # pylint: disable=too-many
         # -------------------------
         ax.set_xlim([x.min(), x.max()])
         ax.set_ylim([x.min(), x.max()])
-        prune = 'upper' if col != (ncol - 1) else None
-        # prune = None
         ax.xaxis.set_major_locator(
-            matplotlib.ticker.MaxNLocator(nbins=5, prune=prune))
+            loc_pruned if col != (ncol - 1) else loc_unpruned)
         if titles is not None:
             ax.set_title(titles[i])
         if row == nrow - 1:
             ax.set_xlabel('$x$')
         else:
-            ax.set_xticklabels([])
+            # tick_params rather than set_xticklabels([]) as the latter
+            # would blank the shared formatter on every axes in the column
+            ax.tick_params(labelbottom=False)
         if col != 0:
-            ax.set_yticklabels([])
+            ax.tick_params(labelleft=False)
     for cbar in cbar_list:
         # If there are not enough samples in the plot, the colourbar will fail
         # with a RuntimeError. This can occur for undersampled models with the
@@ -450,14 +586,11 @@ def adjust_spacing(fig, gs=None, **kwargs):
     hspace = kwargs.pop('hspace', 0.3)
     subplot_height = kwargs.pop('subplot_height', 1.05)
     subplot_width = kwargs.pop('subplot_width', 1.05)
-    if kwargs:
-        raise TypeError('Unexpected **kwargs: {0}'.format(kwargs))
     if kwargs:
         raise TypeError('Unexpected **kwargs: {0}'.format(kwargs))
     figsize = fig.get_size_inches()
     if gs is not None:
-        gs.update(wspace=wspace)
-        gs.update(hspace=hspace)
+        gs.update(wspace=wspace, hspace=hspace)
         nrow = len(gs.get_height_ratios())
         wr = gs.get_width_ratios()
         # Get number of cols excluding color bars
@@ -466,6 +599,22 @@ def adjust_spacing(fig, gs=None, **kwargs):
     else:
         nrow = 1
         ncol = 1
+    adjust = _get_spacing_adjust(
+        (figsize[0], figsize[1]), nrow, ncol, margin_top, margin_bottom,
+        margin_left, margin_right, wspace, hspace, subplot_height,
+        subplot_width)
+    fig.subplots_adjust(**adjust)
+    return fig
+
+
+@functools.lru_cache(maxsize=None)
+def _get_spacing_adjust(figsize, nrow, ncol, margin_top, margin_bottom,
+                        margin_left, margin_right, wspace, hspace,
+                        subplot_height, subplot_width):
+    """Compute subplots_adjust settings for adjust_spacing.
+
+    Memoized as figure sweeps produce many same-shape figures, for which
+    the layout maths is identical."""
     # fit squared vertically into space left after top and bottom margins
     adjust = {'bottom': margin_bottom / figsize[1],
               'right': 1 - (margin_right / figsize[0])}
@@ -475,10 +624,10 @@ def adjust_spacing(fig, gs=None, **kwargs):
     else:
         height = subplot_height * nrow
         height += hspace * (nrow - 1)
-        print(('{} vertical inches remaining. Subplot_height={}, '
-               'figsize={}').format(
-                   figsize[1] - (margin_bottom + margin_top + height),
-                   subplot_height, figsize))
+        LOG.debug(
+            '%s vertical inches remaining. Subplot_height=%s, figsize=%s',
+            figsize[1] - (margin_bottom + margin_top + height),
+            subplot_height, figsize)
         adjust['top'] = (margin_bottom + height) / figsize[1]
     if subplot_width is None:
         # fill entire space left by margins
@@ -486,13 +635,12 @@ def adjust_spacing(fig, gs=None, **kwargs):
     else:
         width = subplot_width * ncol
         width += wspace * (ncol - 1)
-        print(('{} horizontal inches remaining. Subplot_width={}, '
-               'figsize={}').format(
-                   figsize[0] - (margin_left + margin_right + width),
-                   subplot_width, figsize))
+        LOG.debug(
+            '%s horizontal inches remaining. Subplot_width=%s, figsize=%s',
+            figsize[0] - (margin_left + margin_right + width),
+            subplot_width, figsize)
         adjust['left'] = 1 - ((margin_right + width) / figsize[0])
-    fig.subplots_adjust(**adjust)
-    return fig
+    return adjust
 
 
 def fgivenx_plot(func, x, thetas, ax, **kwargs):
@@ -519,8 +667,11 @@ def fgivenx_plot(func, x, thetas, ax, **kwargs):
         the max and min y values and ny.
     ny: int, optional
         Size of y-axis grid for fgivenx plots. Not used if y is not None.
-    cache: str or None
-        Root for fgivenx caching (no caching if None).
+    cache: str or None, optional
+        Root for fgivenx caching. Defaults to a content-addressed root
+        under ~/.cache/bsr/fgivenx keyed on the samples, so regenerating
+        a figure from the same samples reuses the cached PMF. Pass None
+        to disable caching.
     parallel: bool, optional
         fgivenx parallel option.
     rasterize_contours: bool, optional
@@ -532,54 +683,151 @@ def fgivenx_plot(func, x, thetas, ax, **kwargs):
         fgivenx while plotting contours.
     ntrim: int or None, optional
         Max number of samples to trim to.
+    min_eff: float, optional
+        Skip the PMF computation (with a warning, returning None) when
+        the expected number of effective samples is below this. The
+        default sits just above the point where fgivenx's compute_pmf
+        itself fails (n_eff within rounding of 1); anything above that
+        plots fine, so raise it only to deliberately blank undersampled
+        subplots.
 
     Returns
     -------
     cbar: matplotlib colorbar
         For use in higher order functions.
     """
+    colormap = kwargs.pop('colormap', plt.get_cmap('Reds_r'))
+    rasterize_contours = kwargs.pop('rasterize_contours', False)
+    smooth = kwargs.pop('smooth', False)
+    pmf_result = _compute_pmf(func, x, thetas, **kwargs)
+    return _render_pmf(ax, x, pmf_result, colormap=colormap, smooth=smooth,
+                       rasterize_contours=rasterize_contours)
+
+
+# In-process memo of PMF grids keyed on fgivenx cache root, so repeated
+# plots of the same samples within one session skip compute_pmf entirely.
+# Bounded LRU as each entry holds a full PMF grid; evicted results can
+# still be reloaded from the on-disk fgivenx cache
+_pmf_memo = collections.OrderedDict()
+_PMF_MEMO_MAXSIZE = 32
+
+
+def _pmf_cache_root(func, thetas, weights, ny):
+    """Content-addressed fgivenx cache root under ~/.cache/bsr/fgivenx.
+
+    The file name is a hash of the samples, weights and y grid size, so
+    repeated plots of the same samples (e.g. when regenerating paper
+    figures) reuse the cached PMF while changed inputs never collide.
+
+    Returns None for multimodal (list) inputs, which are not hashed.
+    """
+    if isinstance(thetas, list) or isinstance(func, list):
+        return None
+    hasher = hashlib.sha1()
+    hasher.update(np.ascontiguousarray(thetas).tobytes())
+    if weights is not None:
+        hasher.update(np.ascontiguousarray(weights).tobytes())
+    hasher.update(str(ny).encode('utf-8'))
+    name = getattr(func, '__qualname__', type(func).__name__)
+    cache_dir = os.path.join(
+        os.path.expanduser('~'), '.cache', 'bsr', 'fgivenx')
+    os.makedirs(cache_dir, exist_ok=True)
+    return os.path.join(cache_dir, '{}_{}'.format(
+        name.replace('.', '_'), hasher.hexdigest()[:16]))
+
+
+def _compute_pmf(func, x, thetas, **kwargs):
+    """Compute the fgivenx PMF grid for a single subplot.
+
+    Returns (y, pmf), or None if compute_pmf fails due to having too few
+    effective samples."""
     logzs = kwargs.pop('logzs', None)
     weights = kwargs.pop('weights', None)
-    colormap = kwargs.pop('colormap', plt.get_cmap('Reds_r'))
     y = kwargs.pop('y', None)
     ny = kwargs.pop('ny', x.shape[0])
-    cache = kwargs.pop('cache', None)
+    cache = kwargs.pop('cache', 'auto')
     parallel = kwargs.pop('parallel', True)
-    rasterize_contours = kwargs.pop('rasterize_contours', False)
-    smooth = kwargs.pop('smooth', False)
     tqdm_kwargs = kwargs.pop('tqdm_kwargs', {'leave': False})
     ntrim = kwargs.pop('ntrim', None)
+    min_eff = kwargs.pop('min_eff', 1.001)
     if kwargs:
         raise TypeError('Unexpected **kwargs: {0}'.format(kwargs))
+    if isinstance(weights, np.ndarray):
+        # float32 weights halve the memory traffic in fgivenx's
+        # bandwidth-bound PMF binning without visible effect on contours
+        weights = weights.astype(np.float32, copy=False)
+        # Detect undersampled inputs up front - compute_pmf would raise a
+        # ValueError only after doing most of its work
+        n_eff = np.sum(weights) / np.max(weights) if weights.size else 0.0
+        if n_eff < min_eff:
+            warnings.warn(
+                ('Too few effective samples for compute_pmf. '
+                 'Expected # samples={}'.format(n_eff)), UserWarning)
+            return None
+    if cache == 'auto':
+        cache = _pmf_cache_root(func, thetas, weights, ny)
+    if cache is not None and cache in _pmf_memo:
+        _pmf_memo.move_to_end(cache)
+        return _pmf_memo[cache]
     try:
-        y, pmf = fgivenx.drivers.compute_pmf(
+        result = fgivenx.drivers.compute_pmf(
             func, x, thetas, logZ=logzs, weights=weights, parallel=parallel,
             ntrim=ntrim, ny=ny, y=y, cache=cache, tqdm_kwargs=tqdm_kwargs)
-        cbar = fgivenx.plot.plot(
-            x, y, pmf, ax, colors=colormap, smooth=smooth,
-            rasterize_contours=rasterize_contours)
-        return cbar
     except ValueError:
         warnings.warn(
             ('ValueError in compute_pmf. Expected # samples={}'.format(
                 np.sum(weights) / weights.max())), UserWarning)
         return None
+    if cache is not None:
+        _pmf_memo[cache] = result
+        while len(_pmf_memo) > _PMF_MEMO_MAXSIZE:
+            _pmf_memo.popitem(last=False)
+    return result
+
+
+def _compute_pmf_worker(ind_and_args, x, **kwargs):
+    """Compute one subplot's PMF for parallel dispatch in plot_1d_grid.
+
+    The subplot index is passed through so results can be put back in
+    order, as parallel_apply does not preserve input order. fgivenx's own
+    parallelism is turned off to avoid nested process pools.
+
+    Warnings raised while computing (e.g. for skipped undersampled
+    subplots) are captured and returned as strings, as this may run in a
+    worker process where they would otherwise be invisible to the
+    caller; plot_1d_grid re-issues them in the parent process."""
+    ind, func, thetas, weights, logzs = ind_and_args
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter('always')
+        result = _compute_pmf(func, x, thetas, weights=weights, logzs=logzs,
+                              y=x, parallel=False, **kwargs)
+    return ind, result, [str(warning.message) for warning in caught]
+
+
+def _render_pmf(ax, x, pmf_result, colormap=None, smooth=False,
+                rasterize_contours=False):
+    """Draw a PMF grid from _compute_pmf on ax.
+
+    Returns the contour set for use making colorbars, or None if the PMF
+    computation failed."""
+    if pmf_result is None:
+        return None
+    if colormap is None:
+        colormap = plt.get_cmap('Reds_r')
+    y, pmf = pmf_result
+    return fgivenx.plot.plot(
+        x, y, pmf, ax, colors=colormap, smooth=smooth,
+        rasterize_contours=rasterize_contours)
 
 
 def sort_method_list(unsorted):
     """Sort methods so vanilla runs come before adaptive runs and standard
     nested sampling comes before dynamic nested sampling."""
-    out = []
-    out += sorted([meth for meth in unsorted
-                   if ('False' in meth and 'None' in meth)])
-    out += sorted([meth for meth in unsorted
-                   if ('False' in meth and 'None' not in meth)])
-    out += sorted([meth for meth in unsorted
-                   if ('True' in meth and 'None' in meth)])
-    out += sorted([meth for meth in unsorted
-                   if ('True' in meth and 'None' not in meth)])
-    assert set(out) == set(unsorted), [set(out), set(unsorted)]
-    return out
+    def method_key(method):
+        """Key ordering vanilla ('False') before adaptive ('True') and
+        standard ns ('None') before dynamic ns."""
+        return ('True' in method, 'None' not in method, method)
+    return sorted(unsorted, key=method_key)
 
 
 def plot_prior(likelihood, nsamples):
@@ -587,13 +835,18 @@ def plot_prior(likelihood, nsamples):
     parameters."""
     prior = bsr.priors.get_default_prior(
         likelihood.function, likelihood.nfunc, adaptive=likelihood.adaptive)
-    hypercube_samps = np.random.random((nsamples, likelihood.ndim))
-    thetas = np.apply_along_axis(prior, 1, hypercube_samps)
+    # Scrambled Sobol samples cover the hypercube with low discrepancy, so
+    # far fewer samples are needed than with np.random for the same visual
+    # smoothness
+    sampler = scipy.stats.qmc.Sobol(d=likelihood.ndim, scramble=True)
+    hypercube_samps = sampler.random(nsamples)
+    thetas = bsr.priors.batched_prior_call(prior, hypercube_samps)
     if likelihood.data['x2'] is None:
         fig = plot_1d_grid(likelihood.fit_fgivenx, thetas, None)
     else:
         y = likelihood.fit_mean(
             thetas, likelihood.data['x1'], likelihood.data['x2'])
-        print('ymax={} ymean={}'.format(y.max(), np.mean(y)))
+        if LOG.isEnabledFor(logging.DEBUG):
+            LOG.debug('ymax=%s ymean=%s', y.max(), np.mean(y))
         fig = plot_colormap(y, likelihood.data['x1'], likelihood.data['x2'])
     return fig
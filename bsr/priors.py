@@ -4,94 +4,409 @@ the results used in the paper. Most of the functions here build on
 dyPolyChord's priors functionality.
 """
 import copy
+import functools
 import numpy as np
+import scipy.special
 import bsr.basis_functions as bf
 import bsr.neural_networks as nn
 import dyPolyChord.python_priors
 import dyPolyChord.polychord_utils
 
 
+# Precomputed as the Gaussian kernel scales by sigma * sqrt(2) per call
+_SQRT_2 = np.sqrt(2)
+
+
 def get_default_prior(func, nfunc, **kwargs):
-    """Construct a default set of priors for the basis function."""
+    """Construct a default set of priors for the basis function.
+
+    Prior objects are pure functions of their construction arguments, so
+    they are memoized: repeated calls with the same settings (e.g. when
+    frameworks rebuild their configuration) share one cached instance."""
     adaptive = kwargs.pop('adaptive', False)
     sigma_w = kwargs.pop('sigma_w', 5)
     if kwargs:
         raise TypeError('Unexpected **kwargs: {0}'.format(kwargs))
-    # specify default priors
-    if func.__name__ == 'nn_adl':
-        assert isinstance(nfunc, list)
-        assert len(nfunc) == 3
-        assert adaptive
-        nfunc_1l = [nfunc[0], nfunc[-1]]
-        return AdFamPrior([
-            get_default_prior(nn.nn_1l, nfunc_1l, adaptive=adaptive),
-            get_default_prior(nn.nn_2l, nfunc, adaptive=adaptive)])
-    elif func.__name__[:2] == 'nn':
-        # Neural network prior. Here nfunc is a list of numbers of nodes
-        # Note all physical coordinates are scaled by hyperparameter (final
-        # parameter in prior) and hence use sigma=1
-        assert isinstance(nfunc, list)
-        assert len(nfunc) >= 2
-        prior_blocks = []
-        block_sizes = []
-        # Add sorted adaptive parameter on output weights
-        prior_blocks.append(dyPolyChord.python_priors.Gaussian(
-            1.0, adaptive=adaptive, sort=True, half=len(nfunc) == 2))
-        if adaptive:
-            block_sizes.append(nfunc[-1] + 1)
+    if isinstance(nfunc, list):
+        nfunc = tuple(nfunc)  # make hashable for the cache
+    return _get_default_prior_cached(func, nfunc, adaptive, sigma_w)
+
+
+@functools.lru_cache(maxsize=None)
+def _get_default_prior_cached(func, nfunc, adaptive, sigma_w):
+    """Cached worker for get_default_prior. nfunc lists arrive as
+    tuples. Dispatches on func.__name__ via _PRIOR_FACTORIES."""
+    if isinstance(nfunc, tuple):
+        nfunc = list(nfunc)
+    try:
+        factory = _PRIOR_FACTORIES[func.__name__]
+    except KeyError:
+        raise AssertionError('not yet set up for {}'.format(func.__name__))
+    return factory(func, nfunc, adaptive, sigma_w)
+
+
+def _nn_adl_prior(func, nfunc, adaptive, sigma_w):  # pylint: disable=unused-argument
+    """Default prior for adaptive selection between 1 and 2 layer
+    networks."""
+    assert isinstance(nfunc, list)
+    assert len(nfunc) == 3
+    assert adaptive
+    nfunc_1l = [nfunc[0], nfunc[-1]]
+    return AdFamPrior([
+        get_default_prior(nn.nn_1l, nfunc_1l, adaptive=adaptive),
+        get_default_prior(nn.nn_2l, nfunc, adaptive=adaptive)])
+
+
+def _nn_prior(func, nfunc, adaptive, sigma_w):  # pylint: disable=unused-argument
+    """Default neural network prior. Here nfunc is a list of numbers of
+    nodes.
+
+    Note all physical coordinates are scaled by hyperparameter (final
+    parameter in prior) and hence use sigma=1."""
+    assert isinstance(nfunc, list)
+    assert len(nfunc) >= 2
+    prior_blocks = []
+    block_sizes = []
+    # Add sorted adaptive parameter on output weights
+    prior_blocks.append(dyPolyChord.python_priors.Gaussian(
+        1.0, adaptive=adaptive, sort=True, half=len(nfunc) == 2))
+    if adaptive:
+        block_sizes.append(nfunc[-1] + 1)
+    else:
+        block_sizes.append(nfunc[-1])
+    # Priors on remaining weights
+    prior_blocks.append(dyPolyChord.python_priors.Gaussian(1.0))
+    block_sizes.append(nn.nn_num_params(nfunc) - nfunc[-1])
+    # Priors on hyperparameter
+    prior_blocks.append(dyPolyChord.python_priors.PowerUniform(
+        0.1, 20, power=-2))
+    block_sizes.append(1)
+    return dyPolyChord.python_priors.BlockPrior(prior_blocks, block_sizes)
+
+
+def _adfam_gg_ta_prior(func, nfunc, adaptive, sigma_w):  # pylint: disable=unused-argument
+    """Default prior for adaptive selection between gg_1d and ta_1d."""
+    assert adaptive
+    # Need to explicitly provide all args rather than use **kwargs as
+    # kwargs is now empty due to poping
+    return AdFamPrior([
+        get_default_prior(bf.gg_1d, nfunc, adaptive=adaptive),
+        get_default_prior(bf.ta_1d, nfunc, adaptive=adaptive)])
+
+
+def _gg_prior(func, nfunc, adaptive, sigma_w):  # pylint: disable=unused-argument
+    """Default generalised gaussian prior (1d and 2d)."""
+    priors_dict = {
+        'a':     dyPolyChord.python_priors.Exponential(
+            1.0, adaptive=adaptive, sort=True),
+        'mu':    dyPolyChord.python_priors.Uniform(0.0, 1.0),
+        # 0.03 is approx pixel size in 32x32
+        'sigma': dyPolyChord.python_priors.Uniform(0.03, 1.0),
+        'beta':  dyPolyChord.python_priors.Exponential(0.5)}
+    if func.__name__ == 'gg_2d':
+        # reduce max sigma from 1.0 to 0.5 for 2d case
+        priors_dict['sigma'] = dyPolyChord.python_priors.Uniform(
+            0.03, 0.5)
+        for param in ['mu', 'sigma', 'beta']:
+            priors_dict[param + '1'] = priors_dict[param]
+            priors_dict[param + '2'] = priors_dict[param]
+            del priors_dict[param]  # del so error thrown if used
+        priors_dict['omega'] = dyPolyChord.python_priors.Uniform(
+            -0.25 * np.pi, 0.25 * np.pi)
+    return _block_prior_from_dict(func, nfunc, adaptive, priors_dict)
+
+
+def _ta_prior(func, nfunc, adaptive, sigma_w):
+    """Default tanh basis function prior (1d and 2d)."""
+    priors_dict = {
+        'a':   dyPolyChord.python_priors.Gaussian(
+            sigma_w, adaptive=adaptive,
+            sort=True, half=True),
+        'w_0': dyPolyChord.python_priors.Gaussian(sigma_w),
+        'w_1': dyPolyChord.python_priors.Gaussian(sigma_w),
+        'w_2': dyPolyChord.python_priors.Gaussian(sigma_w)}
+    return _block_prior_from_dict(func, nfunc, adaptive, priors_dict)
+
+
+def _block_prior_from_dict(func, nfunc, adaptive, priors_dict):
+    """Assemble a BlockPrior from a dict of per-parameter priors."""
+    # Get a list of the priors we want
+    args = bf.get_bf_param_names(func)
+    prior_blocks = [priors_dict[arg] for arg in args]
+    block_sizes = [nfunc] * len(args)
+    if adaptive:
+        block_sizes[0] += 1
+    return dyPolyChord.python_priors.BlockPrior(prior_blocks, block_sizes)
+
+
+# Dispatch table mapping func.__name__ to its default prior factory;
+# each factory takes (func, nfunc, adaptive, sigma_w)
+_PRIOR_FACTORIES = {
+    'nn_adl': _nn_adl_prior,
+    'nn_fit': _nn_prior,
+    'nn_1l': _nn_prior,
+    'nn_2l': _nn_prior,
+    'adfam_gg_ta_1d': _adfam_gg_ta_prior,
+    'gg_1d': _gg_prior,
+    'gg_2d': _gg_prior,
+    'ta_1d': _ta_prior,
+    'ta_2d': _ta_prior}
+
+
+def batched_prior_call(prior, cubes, dtype=None):
+    """Map an array of hypercube samples through a prior in one call.
+
+    Elementwise prior blocks are applied to whole columns at once rather
+    than once per sample. Blocks which cannot be vectorised in this way
+    (adaptive priors, and prior objects other than BlockPrior) fall back
+    to a row-by-row call.
+
+    Parameters
+    ----------
+    prior: prior object (as returned by get_default_prior)
+    cubes: 2d numpy array
+        Hypercube sample coordinates with shape (nsamples, ndim).
+    dtype: numpy dtype, optional
+        If given, the samples are cast to this dtype and the transforms
+        run (and return) in that precision. np.float32 halves the memory
+        traffic of plotting-scale batches at accuracy far beyond
+        anything visible in a plot; sampling runs should keep the
+        default float64. The row-by-row fallback returns the prior's
+        native precision regardless.
+
+    Returns
+    -------
+    thetas: 2d numpy array
+        Physical parameter values with shape (nsamples, ndim).
+    """
+    assert cubes.ndim == 2, cubes.ndim
+    if dtype is not None:
+        cubes = cubes.astype(dtype, copy=False)
+    if type(prior).__name__ != 'BlockPrior':
+        return np.apply_along_axis(prior, 1, cubes)
+    # Every element is overwritten by a block below, so skip zero-filling
+    thetas = np.empty(cubes.shape, dtype=cubes.dtype)
+    for block, start, end in _block_spans(prior):
+        block_cubes = cubes[:, start:end]
+        if block.adaptive:
+            _adaptive_block_batch(block, block_cubes,
+                                  out=thetas[:, start:end])
+        elif block.sort:
+            # Write the sorted cube values into the output slice, then
+            # transform them to physical values in place
+            out = thetas[:, start:end]
+            _forced_identifiability_batch(block_cubes, out=out)
+            _elementwise_into(block, out, out)
+        elif isinstance(block, _AffineSpan):
+            # Run of Uniform blocks collapsed to one per-column affine
+            # map: a single multiply and add over the whole span
+            out = thetas[:, start:end]
+            np.multiply(block_cubes, block.scales, out=out)
+            out += block.shifts
+        elif _is_identity_block(block):
+            # Uniform(0, 1) maps the hypercube to itself, so just copy
+            thetas[:, start:end] = block_cubes
+        elif type(block).__name__ == 'Uniform':
+            # Affine map written straight into the output slice, rather
+            # than materialising minimum + range * cube temporaries
+            out = thetas[:, start:end]
+            np.multiply(block_cubes, block.maximum - block.minimum, out=out)
+            out += block.minimum
+        else:
+            _elementwise_into(block, block_cubes, thetas[:, start:end])
+    return thetas
+
+
+def _elementwise_into(block, cubes, out):
+    """Apply an elementwise block transform, writing the results into
+    out (which may alias cubes).
+
+    The Gaussian, Exponential and PowerUniform transforms are decomposed
+    into in-place ufunc calls performing the same operations as the
+    block's cube_to_physical, so no per-block temporaries are allocated.
+    Other block types fall back to cube_to_physical plus a copy."""
+    name = type(block).__name__
+    if name == 'Gaussian':
+        if block.half:
+            scipy.special.erfinv(cubes, out=out)
         else:
-            block_sizes.append(nfunc[-1])
-        # Priors on remaining weights
-        prior_blocks.append(dyPolyChord.python_priors.Gaussian(1.0))
-        block_sizes.append(nn.nn_num_params(nfunc) - nfunc[-1])
-        # Priors on hyperparameter
-        prior_blocks.append(dyPolyChord.python_priors.PowerUniform(
-            0.1, 20, power=-2))
-        block_sizes.append(1)
-        return dyPolyChord.python_priors.BlockPrior(prior_blocks, block_sizes)
-    elif func.__name__ == 'adfam_gg_ta_1d':
-        assert adaptive
-        # Need to explicitly provide all args rather than use **kwargs as
-        # kwargs is now empty due to poping
-        return AdFamPrior([
-            get_default_prior(bf.gg_1d, nfunc, adaptive=adaptive),
-            get_default_prior(bf.ta_1d, nfunc, adaptive=adaptive)])
-    elif func.__name__ in ['gg_1d', 'gg_2d', 'ta_1d', 'ta_2d']:
-        if func.__name__ in ['gg_1d', 'gg_2d']:
-            priors_dict = {
-                'a':     dyPolyChord.python_priors.Exponential(
-                    1.0, adaptive=adaptive, sort=True),
-                'mu':    dyPolyChord.python_priors.Uniform(0.0, 1.0),
-                # 0.03 is approx pixel size in 32x32
-                'sigma': dyPolyChord.python_priors.Uniform(0.03, 1.0),
-                'beta':  dyPolyChord.python_priors.Exponential(0.5)}
-            if func.__name__ == 'gg_2d':
-                # reduce max sigma from 1.0 to 0.5 for 2d case
-                priors_dict['sigma'] = dyPolyChord.python_priors.Uniform(
-                    0.03, 0.5)
-                for param in ['mu', 'sigma', 'beta']:
-                    priors_dict[param + '1'] = priors_dict[param]
-                    priors_dict[param + '2'] = priors_dict[param]
-                    del priors_dict[param]  # del so error thrown if used
-                priors_dict['omega'] = dyPolyChord.python_priors.Uniform(
-                    -0.25 * np.pi, 0.25 * np.pi)
-        elif func.__name__ in ['ta_1d', 'ta_2d']:
-            priors_dict = {
-                'a':   dyPolyChord.python_priors.Gaussian(
-                    sigma_w, adaptive=adaptive,
-                    sort=True, half=True),
-                'w_0': dyPolyChord.python_priors.Gaussian(sigma_w),
-                'w_1': dyPolyChord.python_priors.Gaussian(sigma_w),
-                'w_2': dyPolyChord.python_priors.Gaussian(sigma_w)}
-        # Get a list of the priors we want
-        args = bf.get_bf_param_names(func)
-        prior_blocks = [priors_dict[arg] for arg in args]
-        block_sizes = [nfunc] * len(args)
-        if adaptive:
-            block_sizes[0] += 1
-        return dyPolyChord.python_priors.BlockPrior(prior_blocks, block_sizes)
+            np.multiply(cubes, 2, out=out)
+            out -= 1
+            scipy.special.erfinv(out, out=out)
+        out *= block.sigma * _SQRT_2
+        out += block.mu
+    elif name == 'Exponential':
+        np.subtract(1, cubes, out=out)
+        np.log(out, out=out)
+        np.negative(out, out=out)
+        out /= block.lambd
+    elif name == 'PowerUniform':
+        np.divide(cubes, block.const, out=out)
+        if block.power > 0:
+            out += block.minimum ** (1. / block.power)
+        else:
+            np.subtract(block.minimum ** (1. / block.power), out, out=out)
+        np.power(out, block.power, out=out)
     else:
-        raise AssertionError('not yet set up for {}'.format(func.__name__))
+        out[...] = block.cube_to_physical(cubes)
+    return out
+
+
+def _is_identity_block(block):
+    """Check if a prior block is Uniform(0, 1), which maps hypercube
+    coordinates to themselves."""
+    return (type(block).__name__ == 'Uniform'
+            and block.minimum == 0.0 and block.maximum == 1.0)
+
+
+class _AffineSpan(object):
+
+    """Per-column affine map equivalent to a run of consecutive plain
+    Uniform blocks, built by _block_spans. Column n maps cube values as
+    scales[n] * cube + shifts[n], so a whole run costs one multiply and
+    one add regardless of how many blocks it replaces."""
+
+    __slots__ = ('scales', 'shifts')
+
+    adaptive = False
+    sort = False
+
+    def __init__(self, scales, shifts):
+        """Store the per-column coefficient arrays as read-only (they
+        are shared between all calls using the parent prior)."""
+        scales.flags.writeable = False
+        shifts.flags.writeable = False
+        self.scales = scales
+        self.shifts = shifts
+
+
+@functools.lru_cache(maxsize=None)
+def _block_spans(prior):
+    """Get (block, start, end) column spans for a BlockPrior's blocks.
+
+    Runs of consecutive blocks backed by the same elementwise prior
+    object (get_default_prior reuses one instance for e.g. the mu1/mu2
+    blocks of gg_2d) are merged into a single span, so each run is one
+    ufunc call instead of one per block. Sorted and adaptive blocks
+    transform whole blocks at a time and must stay separate.
+
+    Runs of consecutive plain Uniform blocks with different bounds (e.g.
+    the mu and sigma blocks of gg_1d) are also collapsed, into a single
+    _AffineSpan holding per-column scale and shift arrays.
+
+    The spans depend only on the prior's (fixed) block structure, so they
+    are computed once per prior object and cached - get_default_prior
+    returns memoized prior instances so this does not grow unboundedly."""
+    spans = []
+    start = 0
+    for block, size in zip(prior.prior_blocks, prior.block_sizes):
+        end = start + size
+        if (spans and spans[-1][0] is block
+                and not block.adaptive and not block.sort):
+            spans[-1] = (block, spans[-1][1], end)
+        else:
+            spans.append((block, start, end))
+        start = end
+    # Collapse runs of plain Uniform spans into single affine spans
+    merged = []
+    ind = 0
+    while ind < len(spans):
+        run = [spans[ind]]
+        while (_is_plain_uniform(run[-1][0]) and ind + 1 < len(spans)
+               and _is_plain_uniform(spans[ind + 1][0])):
+            ind += 1
+            run.append(spans[ind])
+        if len(run) > 1:
+            scales = np.concatenate(
+                [np.full(end - start, block.maximum - block.minimum)
+                 for block, start, end in run])
+            shifts = np.concatenate(
+                [np.full(end - start, block.minimum)
+                 for block, start, end in run])
+            merged.append(
+                (_AffineSpan(scales, shifts), run[0][1], run[-1][2]))
+        else:
+            merged.append(run[0])
+        ind += 1
+    return merged
+
+
+def _is_plain_uniform(block):
+    """Check if a prior block is a Uniform without adaptive or sorting
+    behaviour, i.e. a pure per-column affine map."""
+    return (type(block).__name__ == 'Uniform'
+            and not block.adaptive and not block.sort)
+
+
+def _adaptive_block_batch(block, cubes, out=None):
+    """Row-wise version of the adaptive BasePrior.__call__ path for a
+    (nsamples, block_size) array.
+
+    The first column is mapped to the nfunc coordinate for all rows at
+    once. For sorted blocks the rows are grouped by their rounded nfunc
+    value, and each group's leading parameters get one batched forced
+    identifiability transform, rather than transforming row by row. Rows
+    with nan first coordinates come out as all-nan, as in the scalar
+    path.
+
+    If out is given the results are written straight into it (and it is
+    returned), saving an intermediate block-sized array; otherwise a new
+    array is allocated."""
+    if out is None:
+        out = np.empty_like(cubes)
+    theta = out
+    theta[:, 1:] = cubes[:, 1:]
+    nfunc_max = cubes.shape[1] - 1
+    theta[:, 0] = ((block.nfunc_min - 0.5)
+                   + (1.0 + nfunc_max - block.nfunc_min) * cubes[:, 0])
+    nan_rows = np.isnan(cubes[:, 0])
+    valid = ~nan_rows
+    if block.sort:
+        nfuncs = np.zeros(cubes.shape[0], dtype=int)
+        nfuncs[valid] = np.round(theta[valid, 0]).astype(int)
+        for nfunc in np.unique(nfuncs[valid]):
+            rows = np.nonzero(nfuncs == nfunc)[0]
+            theta[np.ix_(rows, np.arange(1, 1 + nfunc))] = (
+                _forced_identifiability_batch(cubes[rows, 1:1 + nfunc]))
+    with np.errstate(invalid='ignore'):
+        _elementwise_into(block, theta[:, 1:], theta[:, 1:])
+    if nan_rows.any():
+        theta[nan_rows, :] = np.nan
+    return theta
+
+
+def _forced_identifiability_batch(cubes, out=None):
+    """Row-wise version of dyPolyChord.python_priors.forced_identifiability
+    operating on a (nsamples, ndim) array.
+
+    The sequential recurrence ordered[n] = cube[n]**(1/(n+1)) * ordered[n+1]
+    is a suffix product, so it can be evaluated as one vectorised power
+    followed by a reversed cumulative product - all C-level ufunc passes
+    instead of a Python loop over dimensions. The cumulative product
+    applies the same multiplications in the same order as the
+    recurrence, so (unlike a log/exp formulation) results match the
+    sequential version up to vectorised-vs-scalar pow rounding (at most
+    one ulp).
+
+    If out is given the results are written straight into it (and it is
+    returned), so callers can target the final output buffer without an
+    intermediate array."""
+    terms = np.power(cubes, _inv_exponents(cubes.shape[1]), out=out)
+    np.cumprod(terms[:, ::-1], axis=1, out=terms[:, ::-1])
+    return terms
+
+
+@functools.lru_cache(maxsize=None)
+def _inv_exponents(ndim):
+    """Get the 1/(n+1) exponent array used by the forced identifiability
+    transform.
+
+    Only a handful of distinct lengths occur in a run (one per sorted
+    block size), so the arrays are cached and shared; they are marked
+    read-only to guard against accidental mutation of a shared array."""
+    exponents = 1.0 / np.arange(1, ndim + 1)
+    exponents.flags.writeable = False
+    return exponents
 
 
 class AdFamPrior(object):
@@ -100,6 +415,9 @@ class AdFamPrior(object):
     functions. First coordinate selects family, then different priors are
     applied to the remaining coordinates depending on its value."""
 
+    __slots__ = ('long_prior', 'long_prior_t', 'short_prior',
+                 'short_prior_size', 'family_prior')
+
     def __init__(self, block_prior_list):
         """Store the block priors for each family.
 
@@ -123,6 +441,9 @@ class AdFamPrior(object):
             self.long_prior_t = 2
             self.short_prior = block_prior_list[0]
             self.short_prior_size = prior_sizes[0]
+        # Family selection prior is the same for every call, so construct
+        # it once here rather than once per likelihood evaluation
+        self.family_prior = dyPolyChord.python_priors.Uniform(0.5, 2.5)
 
     def __call__(self, cube):
         """
@@ -139,13 +460,16 @@ class AdFamPrior(object):
         theta: 1d numpy array
             Physical parameter values corresponding to hypercube.
         """
-        theta = np.zeros(cube.shape)
-        theta[0] = dyPolyChord.python_priors.Uniform(0.5, 2.5)(cube[0])
+        theta = np.empty(cube.shape)
+        theta[0] = self.family_prior(cube[0])
         # Apply the longer of the two priors, as we want the trailing values to
         # be filled in with this prior even if the shorter perio is chosen
         theta[1:] = self.long_prior(cube[1:])
         try:
-            nfam = int(np.round(theta[0]))
+            # Pure-Python rounding (same round-half-even as np.round)
+            # avoids a ufunc dispatch and scalar boxing per call; like
+            # int(np.round(...)), round raises ValueError on nan
+            nfam = round(float(theta[0]))
         except ValueError:
             return np.full(cube.shape, np.nan)
         assert nfam in [1, 2], nfam
@@ -320,6 +320,18 @@ class TestData(unittest.TestCase):
                                       file_dir='tests/')
         self.assertEqual(set(data.keys()), set(keys))
 
+    def test_generate_data_batch(self):
+        """Check batched data generation matches individual calls and
+        preserves seed order."""
+        seeds = [3, 1, 2]
+        data_list = bsr.data.generate_data_batch(
+            bf.gg_1d, 1, 0.05, seeds, x_error_sigma=0.05)
+        self.assertEqual([data['random_seed'] for data in data_list], seeds)
+        for seed, data in zip(seeds, data_list):
+            check = bsr.data.generate_data(bf.gg_1d, 1, 0.05,
+                                           x_error_sigma=0.05, seed=seed)
+            numpy.testing.assert_array_equal(data['y'], check['y'])
+
     def test_get_data_args(self):
         """Check right number of args is supplied."""
         for data_func in [bf.gg_1d, bf.gg_2d, bf.ta_1d]:
@@ -453,6 +465,22 @@ class TestPriors(unittest.TestCase):
         # return to original random state
         np.random.set_state(state)
 
+    @staticmethod
+    def test_batched_prior_call():
+        """Check column-wise batched prior calls match applying the prior
+        to each sample row individually."""
+        state = np.random.get_state()
+        np.random.seed(0)
+        for adaptive in [False, True]:
+            prior = bsr.priors.get_default_prior(
+                bf.gg_1d, 2, adaptive=adaptive)
+            cubes = np.random.random((10, sum(prior.block_sizes)))
+            numpy.testing.assert_allclose(
+                bsr.priors.batched_prior_call(prior, cubes),
+                np.apply_along_axis(prior, 1, cubes))
+        # return to original random state
+        np.random.set_state(state)
+
     @staticmethod
     def test_default_ta_1d_prior():
         """Check the numerical values from the default prior."""